@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def read_json(p: Path) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads(p.read_bytes())
+    except Exception:
+        return None
+
+def dump_json(obj) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE)
+        except orjson.JSONEncodeError:
+            # e.g. ints wider than 64 bits or non-str keys from a caller payload
+            pass
+    return (json.dumps(obj, indent=2, ensure_ascii=False) + "\n").encode("utf-8")
+
+def _stdlib_canonical_bytes(obj) -> bytes:
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+_JSON_CONSTANTS = {"NaN": float("nan"), "Infinity": float("inf"), "-Infinity": float("-inf")}
+
+def load_event(raw: bytes) -> Tuple[Any, bool]:
+    """
+    json.loads(raw), plus whether the document holds any float (NaN and
+    Infinity included) -- noted by the parser, so that canonical_bytes can
+    take the orjson route for float-free events without walking them.
+    """
+    floats = []
+
+    def parse_float(s: str) -> float:
+        floats.append(s)
+        return float(s)
+
+    def parse_constant(s: str) -> float:
+        floats.append(s)
+        return _JSON_CONSTANTS[s]
+
+    return json.loads(raw, parse_float=parse_float, parse_constant=parse_constant), bool(floats)
+
+def read_event(p: Path) -> Tuple[Optional[Dict[str, Any]], bool]:
+    try:
+        return load_event(p.read_bytes())
+    except Exception:
+        return None, False
+
+def canonical_bytes(obj, float_free: bool = False) -> bytes:
+    """
+    Canonicalize for hashing/signing:
+      - JSON with sorted keys
+      - no whitespace
+      - utf-8
+    These bytes are the stdlib encoding. orjson formats floats differently
+    (1e16 vs 1e+16, NaN as null), so it is only used when the caller vouches
+    that obj holds no float (float_free, as reported by load_event); anything
+    it still refuses (e.g. ints wider than 64 bits) goes to the stdlib.
+    """
+    if float_free and orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+        except orjson.JSONEncodeError:
+            pass
+    return _stdlib_canonical_bytes(obj)
+
+def atomic_write_bytes(path: Path, data: bytes) -> None:
+    # readers see either the old file or the new one, never a partial write
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def is_current(path: Path, data: bytes) -> bool:
+    try:
+        return path.read_bytes() == data
+    except FileNotFoundError:
+        return False
+
+def nowstamp() -> str:
+    return time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+
+def is_ts(s: str) -> bool:
+    # 20260130T225747Z
+    return len(s) == 16 and s[8] == "T" and s[15] == "Z" and s[:8].isdigit() and s[9:15].isdigit()
+
+def parse_ts(s: str) -> Optional[datetime]:
+    try:
+        if len(s) != 16 or s[8] != "T" or s[15] != "Z":
+            return None
+        return datetime(int(s[0:4]), int(s[4:6]), int(s[6:8]),
+                        int(s[9:11]), int(s[11:13]), int(s[13:15]), tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return None
+
+def iso_duration(td: timedelta) -> str:
+    total = int(td.total_seconds())
+    if total < 0:
+        total = 0
+    d, r = total // 86400, total % 86400
+    h, m, s = r // 3600, r % 3600 // 60, r % 60
+    return f"P{f'{d}D' if d else ''}T{f'{h}H' if h else ''}{f'{m}M' if m else ''}{s}S"
+
+def list_event_files(decisions: Path) -> List[Path]:
+    names = []
+    try:
+        with os.scandir(decisions) as it:
+            for e in it:
+                if e.name.endswith(".json") and is_ts(e.name[:-5]):
+                    names.append(e.name)
+    except FileNotFoundError:
+        pass
+    # fixed-width timestamp names: lexical order is chronological order
+    names.sort()
+    return [decisions / n for n in names]
+
+def is_chain_entry(entry) -> bool:
+    # [mtime_ns, size, prev_hash, event_hash] as kept by the chain caches
+    if not (isinstance(entry, list) and len(entry) == 4 and isinstance(entry[3], str) and len(entry[3]) == 64):
+        return False
+    try:
+        return len(bytes.fromhex(entry[3])) == 32
+    except ValueError:
+        return False
+
+def load_chain_cache(entries) -> Dict[str, List[Any]]:
+    """
+    The well-formed entries of a chain cache read back from disk; anything
+    else is dropped, so it is a cache miss rather than a crash.
+    """
+    if not isinstance(entries, dict):
+        return {}
+    return {k: v for k, v in entries.items() if is_chain_entry(v)}
+
+def _ssh_string(buf: bytes, off: int) -> Tuple[bytes, int]:
+    # SSH wire format: uint32 length || bytes
+    end = off + 4 + int.from_bytes(buf[off:off + 4], "big")
+    if end > len(buf):
+        raise ValueError("truncated SSH string")
+    return buf[off + 4:end], end
+
+def _ssh_pack(b: bytes) -> bytes:
+    return len(b).to_bytes(4, "big") + b
+
+def verify_sshsig(armored: bytes, message: bytes, allowed: Path, principal: str, namespace: str) -> Optional[bool]:
+    """
+    In-process equivalent of `ssh-keygen -Y verify` for an Ed25519 signer
+    (OpenSSH PROTOCOL.sshsig). Returns None when it cannot decide -- the
+    cryptography package is missing, or the signing key is not on any plain
+    ssh-ed25519 line for principal in allowed (options, CA or wildcard lines
+    are left to ssh-keygen) -- so the caller can fall back to ssh_keygen_verify.
+    """
+    import base64
+    try:
+        from cryptography.exceptions import InvalidSignature
+        from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+    except ImportError:
+        return None
+
+    # every key listed for principal is accepted, e.g. old and new during a rotation
+    trusted = set()
+    for line in allowed.read_text(encoding="utf-8").splitlines():
+        parts = line.split()
+        if len(parts) >= 3 and principal in parts[0].split(",") and parts[1] == "ssh-ed25519":
+            try:
+                trusted.add(base64.b64decode(parts[2], validate=True))
+            except ValueError:
+                # malformed key: skip it; if the signer was meant to be on this
+                # line, the key lookup below misses and ssh-keygen decides
+                continue
+
+    try:
+        lines = armored.decode("ascii").strip().splitlines()
+        if lines[0] != "-----BEGIN SSH SIGNATURE-----" or lines[-1] != "-----END SSH SIGNATURE-----":
+            return False
+        blob = base64.b64decode("".join(lines[1:-1]))
+        if blob[:6] != b"SSHSIG" or int.from_bytes(blob[6:10], "big") != 1:
+            return False
+        pubkey, off = _ssh_string(blob, 10)
+        ns, off = _ssh_string(blob, off)
+        reserved, off = _ssh_string(blob, off)
+        hash_alg, off = _ssh_string(blob, off)
+        sig, off = _ssh_string(blob, off)
+        sig_type, off = _ssh_string(sig, 0)
+        sig_raw, _ = _ssh_string(sig, off)
+        key_type, off = _ssh_string(pubkey, 0)
+        key_raw, _ = _ssh_string(pubkey, off)
+    except (ValueError, IndexError, UnicodeDecodeError):
+        return False
+
+    if pubkey not in trusted:
+        return None
+    if key_type != b"ssh-ed25519" or sig_type != b"ssh-ed25519":
+        return False
+    if ns != namespace.encode("utf-8") or hash_alg not in (b"sha256", b"sha512"):
+        return False
+
+    signed = b"SSHSIG" + b"".join(
+        _ssh_pack(x) for x in (ns, reserved, hash_alg, hashlib.new(hash_alg.decode("ascii"), message).digest())
+    )
+    try:
+        Ed25519PublicKey.from_public_bytes(key_raw).verify(sig_raw, signed)
+    except (InvalidSignature, ValueError):
+        return False
+    return True
+
+def ssh_keygen_verify(armored: bytes, message: bytes, allowed: Path, principal: str, namespace: str):
+    """
+    `ssh-keygen -Y verify` fallback for verify_sshsig; returns the
+    CompletedProcess (returncode 0 means valid). The signature goes through a
+    private temp file, so concurrent verifiers never share one.
+    """
+    import subprocess
+    import tempfile
+
+    with tempfile.NamedTemporaryFile(prefix=".latest.sig.", suffix=".ssh") as sig_tmp:
+        sig_tmp.write(armored)
+        sig_tmp.flush()
+        return subprocess.run(
+            ["ssh-keygen", "-Y", "verify", "-f", str(allowed), "-I", principal, "-n", namespace, "-s", sig_tmp.name],
+            input=message,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
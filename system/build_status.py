@@ -1,11 +1,11 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
-import json
-import re
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 from pathlib import Path
 
+from _witness import atomic_write_bytes, dump_json, is_current, iso_duration, parse_ts, read_json
+
 ROOT = Path(__file__).resolve().parents[1]
 DECISIONS = ROOT / "decisions"
 CHECKPOINTS = ROOT / "checkpoints"
@@ -14,36 +14,6 @@ PUBLIC_WITNESS = ROOT / "public" / "witness"
 
 SCHEMA_VERSION = "1.0.0"
 
-def read_json(p: Path):
-    try:
-        return json.loads(p.read_text(encoding="utf-8"))
-    except Exception:
-        return None
-
-def parse_ts(s: str):
-    try:
-        return datetime.strptime(s, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
-    except Exception:
-        return None
-
-def iso_duration(td: timedelta):
-    total = int(td.total_seconds())
-    if total < 0:
-        total = 0
-    m, s = divmod(total, 60)
-    h, m = divmod(m, 60)
-    d, h = divmod(h, 24)
-    out = "P"
-    if d:
-        out += f"{d}D"
-    out += "T"
-    if h:
-        out += f"{h}H"
-    if m:
-        out += f"{m}M"
-    out += f"{s}S"
-    return out
-
 def main() -> int:
     latest = read_json(DECISIONS / "latest.json") or {}
     raid0 = read_json(DECISIONS / "raid0.json") or {}
@@ -125,8 +95,13 @@ def main() -> int:
     WITNESS.mkdir(parents=True, exist_ok=True)
     PUBLIC_WITNESS.mkdir(parents=True, exist_ok=True)
 
-    (WITNESS / "status.json").write_text(json.dumps(out, indent=2) + "\n", encoding="utf-8")
-    (PUBLIC_WITNESS / "status.json").write_text(json.dumps(out, indent=2) + "\n", encoding="utf-8")
+    data = dump_json(out)
+    if is_current(WITNESS / "status.json", data) and is_current(PUBLIC_WITNESS / "status.json", data):
+        print("witness/status.json unchanged")
+        return 0
+
+    atomic_write_bytes(WITNESS / "status.json", data)
+    atomic_write_bytes(PUBLIC_WITNESS / "status.json", data)
 
     print("wrote witness/status.json and public/witness/status.json")
     return 0
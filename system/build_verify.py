@@ -1,14 +1,25 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
-import base64
 import hashlib
-import json
-import re
-import subprocess
+import time
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+from _witness import (
+    atomic_write_bytes,
+    canonical_bytes,
+    dump_json,
+    is_current,
+    list_event_files,
+    load_chain_cache,
+    load_event,
+    parse_ts,
+    read_json,
+    ssh_keygen_verify,
+    verify_sshsig,
+)
 
 ROOT = Path(__file__).resolve().parents[1]
 DECISIONS = ROOT / "decisions"
@@ -18,74 +29,122 @@ PUBLIC_WITNESS = ROOT / "public" / "witness"
 
 SIG_JSON = CHECKPOINTS / "latest.sig"
 CHECKPOINT_JSON = CHECKPOINTS / "latest.json"
-SIG_TMP = CHECKPOINTS / ".latest.sig.ssh"
+VERIFY_CACHE = WITNESS / ".verify_cache.json"
 
 ALLOWED = ROOT / "witness" / "keys" / "allowed_signers"
 PRINCIPAL = "sonofanton_checkpoint_ed25519_v2"
 NAMESPACE = "sonofanton-checkpoint"
 
 SCHEMA_VERSION = "1.0.0"
-TS_RE = re.compile(r"^\d{8}T\d{6}Z$")
 
-def parse_compact_ts(s: str):
-    try:
-        return datetime.strptime(s, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
-    except Exception:
-        return None
+# raw event file bytes -> (prev_hash, event_hash, canonical payload bytes)
+_CBYTES_CACHE: Dict[bytes, Tuple[Any, Any, bytes]] = {}
+# (sha256 of payload, signature, allowed_signers) -> signature verdict
+_VERIFY_CACHE: Dict[Tuple[str, str, str], bool] = {}
 
 
-def read_json(p: Path) -> Optional[Dict[str, Any]]:
+def canonical_event(p: Path) -> Optional[Tuple[Any, Any, bytes]]:
+    """
+    (prev_hash, event_hash, canonical payload bytes) for an event file.
+    Memoized on the raw file bytes, so a rewritten file is never served stale.
+    """
     try:
-        return json.loads(p.read_text(encoding="utf-8"))
-    except Exception:
+        raw = p.read_bytes()
+    except OSError:
         return None
-
-def canonical_bytes(obj: Dict[str, Any]) -> bytes:
-    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
-
-def sha256_hex(b: bytes) -> str:
-    return hashlib.sha256(b).hexdigest()
-
-def list_event_files() -> List[Path]:
-    files = []
-    for p in DECISIONS.glob("*.json"):
-        if TS_RE.match(p.stem):
-            files.append(p)
-    return sorted(files, key=lambda x: x.stem)
-
-def verify_chain(events: List[Dict[str, Any]]) -> bool:
+    hit = _CBYTES_CACHE.get(raw)
+    if hit is None:
+        try:
+            ev, has_float = load_event(raw)
+        except ValueError:
+            return None
+        if not isinstance(ev, dict):
+            return None
+        # ev is private to this call, so strip the hash fields in place
+        prev_hash = ev.pop("prev_hash", None)
+        event_hash = ev.pop("event_hash", None)
+        hit = (prev_hash, event_hash, canonical_bytes(ev, float_free=not has_float))
+        _CBYTES_CACHE[raw] = hit
+    return hit
+
+def verify_chain(files: List[Path]) -> Tuple[bool, int, bool]:
+    """
+    (chain valid, number of readable events, whether any were taken from the
+    verify cache instead of being re-hashed).
+    """
+    # file name -> [mtime_ns, size, prev_hash, event_hash] of events already verified
+    cache = load_chain_cache(read_json(VERIFY_CACHE))
+    verified: Dict[str, List[Any]] = {}
+    ok = True
+    count = 0
+    cached = False
     prev = "0" * 64
-    for ev in events:
-        if ev.get("prev_hash") != prev:
-            return False
-        payload = dict(ev)
-        payload.pop("event_hash", None)
-        payload.pop("prev_hash", None)
+    prev_raw = bytes(32)
+    for f in files:
+        if not ok:
+            # past a break nothing is verified, but readable events still count
+            count += canonical_event(f) is not None
+            continue
+        try:
+            st = f.stat()
+        except OSError:
+            # removed since it was listed: unreadable, like any other
+            continue
+        hit = cache.get(f.name)
+        if hit is not None and hit[:3] == [st.st_mtime_ns, st.st_size, prev]:
+            verified[f.name] = hit
+            prev = hit[3]
+            prev_raw = bytes.fromhex(prev)
+            count += 1
+            cached = True
+            continue
+        event = canonical_event(f)
+        if event is None:
+            continue
+        count += 1
+        ev_prev, ev_hash, cb = event
+        if ev_prev != prev:
+            ok = False
+            continue
         # chain hash = sha256(prev_bytes || canonical(payload))
-        h = sha256_hex(bytes.fromhex(prev) + canonical_bytes(payload))
-        if ev.get("event_hash") != h:
-            return False
-        prev = h
-    return True
+        hasher = hashlib.sha256(prev_raw)
+        hasher.update(cb)
+        digest = hasher.digest()
+        h = digest.hex()
+        if ev_hash != h:
+            ok = False
+            continue
+        verified[f.name] = [st.st_mtime_ns, st.st_size, prev, h]
+        prev, prev_raw = h, digest
+
+    WITNESS.mkdir(parents=True, exist_ok=True)
+    data = dump_json(verified)
+    if not is_current(VERIFY_CACHE, data):
+        atomic_write_bytes(VERIFY_CACHE, data)
+    return ok, count, cached
 
 def verify_checkpoint_signature() -> bool:
+    # only the signature check needs this; keep it off the import path
+    import base64
+
     sig_obj = read_json(SIG_JSON)
     if not sig_obj or not SIG_JSON.exists() or not CHECKPOINT_JSON.exists() or not ALLOWED.exists():
         return False
     sig_raw = base64.b64decode(sig_obj["signature"])
-    SIG_TMP.write_bytes(sig_raw)
     payload = canonical_bytes(read_json(CHECKPOINT_JSON) or {})
-    p = subprocess.run(
-        ["ssh-keygen", "-Y", "verify", "-f", str(ALLOWED), "-I", PRINCIPAL, "-n", NAMESPACE, "-s", str(SIG_TMP)],
-        input=payload,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
+    key = (
+        hashlib.sha256(payload).hexdigest(),
+        hashlib.sha256(sig_raw).hexdigest(),
+        hashlib.sha256(ALLOWED.read_bytes()).hexdigest(),
     )
-    try:
-        SIG_TMP.unlink()
-    except FileNotFoundError:
-        pass
-    return p.returncode == 0
+    cached = _VERIFY_CACHE.get(key)
+    if cached is not None:
+        return cached
+    ok = verify_sshsig(sig_raw, payload, ALLOWED, PRINCIPAL, NAMESPACE)
+    if ok is None:
+        ok = ssh_keygen_verify(sig_raw, payload, ALLOWED, PRINCIPAL, NAMESPACE).returncode == 0
+    _VERIFY_CACHE[key] = ok
+    return ok
 
 def main() -> int:
     checkpoint = read_json(CHECKPOINT_JSON) or {}
@@ -94,29 +153,23 @@ def main() -> int:
     checkpoint_age_seconds = None
     checkpoint_considered_fresh = None
     _gat = checkpoint.get('generated_at')
-    _gdt = parse_compact_ts(_gat) if isinstance(_gat, str) else None
+    _gdt = parse_ts(_gat) if isinstance(_gat, str) else None
     if _gdt:
         checkpoint_age_seconds = int((datetime.now(timezone.utc) - _gdt).total_seconds())
         checkpoint_considered_fresh = checkpoint_age_seconds <= freshness_threshold_seconds
 
-    files = list_event_files()
-    events = []
-    for f in files:
-        ev = read_json(f)
-        if isinstance(ev, dict):
-            events.append(ev)
-
-    chain_ok = verify_chain(events)
+    files = list_event_files(DECISIONS)
+    chain_ok, event_count, used_cache = verify_chain(files)
 
     head = checkpoint.get("head_event_hash")
     count = checkpoint.get("event_count")
 
     out = {
         "schema_version": SCHEMA_VERSION,
-        "verified_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
-        "verification_scope": "full_history",
+        "verified_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "verification_scope": "incremental" if used_cache else "full_history",
         "chain": {
-            "event_count": count if isinstance(count, int) else len(events),
+            "event_count": count if isinstance(count, int) else event_count,
             "head_event_hash": head,
             "hash_chain_valid": bool(chain_ok),
         },
@@ -136,8 +189,13 @@ def main() -> int:
     WITNESS.mkdir(parents=True, exist_ok=True)
     PUBLIC_WITNESS.mkdir(parents=True, exist_ok=True)
 
-    (WITNESS / "verify.json").write_text(json.dumps(out, indent=2) + "\n", encoding="utf-8")
-    (PUBLIC_WITNESS / "verify.json").write_text(json.dumps(out, indent=2) + "\n", encoding="utf-8")
+    data = dump_json(out)
+    if is_current(WITNESS / "verify.json", data) and is_current(PUBLIC_WITNESS / "verify.json", data):
+        print("witness/verify.json unchanged")
+        return 0
+
+    atomic_write_bytes(WITNESS / "verify.json", data)
+    atomic_write_bytes(PUBLIC_WITNESS / "verify.json", data)
 
     print("wrote witness/verify.json and public/witness/verify.json")
     return 0
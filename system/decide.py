@@ -1,17 +1,14 @@
 #!/usr/bin/env python3
 import json
-import os
-from datetime import datetime, timezone
 from pathlib import Path
 
+from _witness import atomic_write_bytes, dump_json, nowstamp
+
 ROOT = Path(__file__).resolve().parents[1]
 DECISIONS = ROOT / "decisions"
 LOGS = ROOT / "logs"
 CONSTRAINTS = ROOT / "constraints"
 
-def nowstamp():
-  return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
-
 def load_constraints():
   p = CONSTRAINTS / "active.json"
   if p.exists():
@@ -37,22 +34,17 @@ def write_decision(payload):
     **payload,
   }
 
-  (DECISIONS / f"{decision_id}.json").write_text(json.dumps(out, indent=2) + "\n")
-  (DECISIONS / "latest.json").write_text(json.dumps({
+  atomic_write_bytes(DECISIONS / f"{decision_id}.json", dump_json(out))
+  atomic_write_bytes(DECISIONS / "latest.json", dump_json({
     "status": out["status"],
     "evaluation": out["evaluation"],
     "human_override": out["human_override"],
     "decision_source": out["decision_source"],
     "last_evaluation": out["timestamp"]
-  }, indent=2) + "\n")
-
-  (LOGS / "events.log").write_text(
-    f"{out['timestamp']} decision={decision_id} constraint={out['constraints'].get('constraint','')}\n",
-    encoding="utf-8",
-    errors="ignore"
-  ) if not (LOGS / "events.log").exists() else (LOGS / "events.log").open("a", encoding="utf-8").write(
-    f"{out['timestamp']} decision={decision_id} constraint={out['constraints'].get('constraint','')}\n"
-  )
+  }))
+
+  with (LOGS / "events.log").open("a", encoding="utf-8") as f:
+    f.write(f"{out['timestamp']} decision={decision_id} constraint={out['constraints'].get('constraint','')}\n")
 
 if __name__ == "__main__":
   # Minimal payload. Expand later.
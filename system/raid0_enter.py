@@ -1,16 +1,14 @@
 #!/usr/bin/env python3
 from __future__ import annotations
-import json
-from datetime import datetime, timezone
 from pathlib import Path
 
+from _witness import atomic_write_bytes, dump_json, nowstamp
+
 ROOT = Path(__file__).resolve().parents[1]
 DECISIONS = ROOT / "decisions"
 
-def ts(): return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
-
 def main():
-    t = ts()
+    t = nowstamp()
     ev = {
         "id": t,
         "timestamp": t,
@@ -28,7 +26,7 @@ def main():
         "human_override": "not_requested",
         "decision_source": "son_of_anton"
     }
-    (DECISIONS / f"{t}.json").write_text(json.dumps(ev, indent=2) + "\n", encoding="utf-8")
+    atomic_write_bytes(DECISIONS / f"{t}.json", dump_json(ev))
     print(f"wrote decisions/{t}.json")
 
 if __name__ == "__main__":
@@ -1,67 +1,32 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
-import json
-import re
-from datetime import datetime, timezone, timedelta
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from _witness import atomic_write_bytes, dump_json, iso_duration, list_event_files, parse_ts, read_json
 
 ROOT = Path(__file__).resolve().parents[1]
 DECISIONS = ROOT / "decisions"
 
-TS_RE = re.compile(r"^\d{8}T\d{6}Z$")
-
-def parse_ts(s: str) -> datetime | None:
-    try:
-        return datetime.strptime(s, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
-    except Exception:
-        return None
-
 def fmt_ts(dt: datetime) -> str:
     return dt.strftime("%Y%m%dT%H%M%SZ")
 
-def iso_duration(td: timedelta) -> str:
-    total = int(td.total_seconds())
-    if total < 0: total = 0
-    m, s = divmod(total, 60)
-    h, m = divmod(m, 60)
-    d, h = divmod(h, 24)
-    out = "P"
-    if d: out += f"{d}D"
-    out += "T"
-    if h: out += f"{h}H"
-    if m: out += f"{m}M"
-    out += f"{s}S"
-    return out
-
-def read_json(p: Path):
-    try:
-        return json.loads(p.read_text(encoding="utf-8"))
-    except Exception:
-        return None
-
-def list_event_files():
-    files = []
-    for p in DECISIONS.glob("*.json"):
-        if TS_RE.match(p.stem):
-            files.append(p)
-    return sorted(files, key=lambda x: x.stem)
-
-def main():
-    files = list_event_files()
-    events = []
-    for f in files:
+def last_raid0_entered(files: List[Path]) -> Optional[Dict[str, Any]]:
+    # event files sort chronologically, so walk newest first and stop at the
+    # first hit: only the events since the last raid0 entry are parsed
+    for f in reversed(files):
         ev = read_json(f)
-        if isinstance(ev, dict):
-            events.append(ev)
+        if isinstance(ev, dict) and ev.get("type") == "authority_transition" and ev.get("event") == "raid0_entered":
+            return ev
+    return None
 
-    # find last raid0_entered
-    entered = None
-    for ev in reversed(events):
-        if ev.get("type") == "authority_transition" and ev.get("event") == "raid0_entered":
-            entered = ev
-            break
+def main():
+    files = list_event_files(DECISIONS)
 
+    entered = last_raid0_entered(files)
     if not entered:
         print("no prior raid0_entered found; refusing to exit")
         return 2
@@ -75,15 +40,12 @@ def main():
     now = datetime.now(timezone.utc)
     exit_id = fmt_ts(now)
 
-    # count decisions during raid0 window (strictly between enter and exit inclusive)
+    # count decisions during raid0 window (strictly between enter and exit inclusive);
+    # event files are named by their id, so the window is a slice of the sorted stems
     enter_str = fmt_ts(enter_dt)
-    count_during = 0
-    for ev in events:
-        eid = ev.get("id") or ev.get("timestamp")
-        if isinstance(eid, str) and TS_RE.match(eid):
-            if enter_str <= eid <= exit_id:
-                # count "decision-like" events; here we count all timestamp events (simple v1)
-                count_during += 1
+    stems = [f.stem for f in files]
+    # count "decision-like" events; here we count all timestamp events (simple v1)
+    count_during = bisect_right(stems, exit_id) - bisect_left(stems, enter_str)
 
     duration = iso_duration(now - enter_dt)
 
@@ -110,7 +72,7 @@ def main():
     }
 
     p = DECISIONS / f"{exit_id}.json"
-    p.write_text(json.dumps(out, indent=2) + "\n", encoding="utf-8")
+    atomic_write_bytes(p, dump_json(out))
     print(f"wrote {p}")
     return 0
 
@@ -1,16 +1,13 @@
 #!/usr/bin/env python3
-import json
-from datetime import datetime, timezone
 from pathlib import Path
 
+from _witness import atomic_write_bytes, dump_json, nowstamp
+
 ROOT = Path(__file__).resolve().parents[1]
 DECISIONS = ROOT / "decisions"
 LOGS = ROOT / "logs"
 TIME_REF = DECISIONS / "time_reference.json"
 
-def nowstamp():
-  return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
-
 def append_log(line: str):
   LOGS.mkdir(exist_ok=True)
   with (LOGS / "events.log").open("a", encoding="utf-8") as f:
@@ -33,7 +30,7 @@ def main():
     "reversible": False
   }
 
-  TIME_REF.write_text(json.dumps(artifact, indent=2) + "\n", encoding="utf-8")
+  atomic_write_bytes(TIME_REF, dump_json(artifact))
   append_log(f"{ts} time_reference=asserted value=global_phase_coherence")
 
 if __name__ == "__main__":
@@ -1,17 +1,15 @@
 #!/usr/bin/env python3
 import json
 import hashlib
-from datetime import datetime, timezone
 from pathlib import Path
 
+from _witness import atomic_write_bytes, dump_json, nowstamp
+
 ROOT = Path(__file__).resolve().parents[1]
 DECISIONS = ROOT / "decisions"
 LOGS = ROOT / "logs"
 CONSTRAINTS = ROOT / "constraints"
 
-def nowstamp():
-  return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
-
 def load_constraints_bytes():
   p = CONSTRAINTS / "active.json"
   if p.exists():
@@ -50,15 +48,15 @@ def main():
     # intentionally no "note"
   }
 
-  (DECISIONS / f"{ts}.json").write_text(json.dumps(artifact, indent=2) + "\n")
+  atomic_write_bytes(DECISIONS / f"{ts}.json", dump_json(artifact))
 
-  (DECISIONS / "latest.json").write_text(json.dumps({
+  atomic_write_bytes(DECISIONS / "latest.json", dump_json({
     "status": "INACTIVE",
     "evaluation": [],
     "human_override": "not_requested",
     "decision_source": "son_of_anton",
     "last_evaluation": ts
-  }, indent=2) + "\n")
+  }))
 
   append_log(f"{ts} tombstone=1 constraint={artifact['constraints'].get('constraint','')}")
 
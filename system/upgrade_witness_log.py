@@ -1,80 +1,68 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import argparse
 import hashlib
 import json
-import re
-from dataclasses import dataclass
-from datetime import datetime, timezone
+import os
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
+from _witness import atomic_write_bytes, canonical_bytes, list_event_files, load_chain_cache, read_event, read_json
+
 ROOT = Path(__file__).resolve().parents[1]
 DECISIONS = ROOT / "decisions"
 CHECKPOINTS = ROOT / "checkpoints"
+MMR_STATE = CHECKPOINTS / "_mmr_state.json"
+HASH_CACHE = CHECKPOINTS / ".hash_cache.json"
+CHECKPOINTS_BIN = CHECKPOINTS / "checkpoints.bin"
 
 SCHEMA_VERSION = "1.0.0"
-BASELINE_EVAL = ["human_override", "temporal_authority", "safety_limits"]
+BASELINE_EVAL = ("human_override", "temporal_authority", "safety_limits")
+# constraint keys that count as declared safety limits
+_GUARD_KEYS = frozenset({"safety_limits", "max_tokens", "max_duration"})
 HASH_ALGO = "sha256"
-
-# Meta / non-event JSON files to ignore in chaining/migration
-IGNORE = {
-    "latest.json",
-    "raid0.json",
-    "time_reference.json",
-    "time_notice.json",
-}
-
-TS_RE = re.compile(r"^\d{8}T\d{6}Z$")  # 20260130T225747Z
-
-def read_json(p: Path) -> Optional[Dict[str, Any]]:
-    try:
-        return json.loads(p.read_text(encoding="utf-8"))
-    except Exception:
-        return None
+# checkpoints.bin record: event_count, head_event_hash, merkle_root, generated_at (unix ns)
+CHECKPOINT_REC = struct.Struct("<I32s32sQ")
 
 def write_json(p: Path, obj: Dict[str, Any]) -> None:
-    p.write_text(json.dumps(obj, indent=2, sort_keys=False) + "\n", encoding="utf-8")
+    atomic_write_bytes(p, (json.dumps(obj, indent=2, sort_keys=False) + "\n").encode("utf-8"))
 
-def canonical_bytes(obj: Dict[str, Any]) -> bytes:
+def hash_pairs(buf: bytes, n_nodes: int) -> bytes:
     """
-    Canonicalize for hashing:
-      - JSON with sorted keys
-      - no whitespace
-      - utf-8
+    Next Merkle layer: SHA256 over each consecutive 64-byte (left || right)
+    pair of the n_nodes 32-byte nodes in buf. An odd last node is paired
+    with itself by feeding it to the hasher twice, so the layer is never
+    copied just to duplicate its tail.
     """
-    s = json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
-    return s.encode("utf-8")
-
-def sha256_hex(data: bytes) -> str:
-    return hashlib.sha256(data).hexdigest()
-
-def merkle_root_hex(hashes: List[str]) -> Optional[str]:
+    sha256 = hashlib.sha256
+    with memoryview(buf) as mv:
+        out = [sha256(mv[i:i + 64]).digest() for i in range(0, n_nodes // 2 * 64, 64)]
+        if n_nodes & 1:
+            tail = sha256(mv[-32:])
+            tail.update(mv[-32:])
+            out.append(tail.digest())
+    return b"".join(out)
+
+def merkle_root_hex(hashes: List[bytes]) -> Optional[str]:
     """
-    Merkle root over hex hashes using SHA256 on concatenated raw bytes.
+    Merkle root over raw 32-byte hashes using SHA256 on concatenated bytes.
     If odd count, duplicate last.
     """
     if not hashes:
         return None
-    layer = [bytes.fromhex(h) for h in hashes]
-    while len(layer) > 1:
-        nxt = []
-        for i in range(0, len(layer), 2):
-            left = layer[i]
-            right = layer[i+1] if i+1 < len(layer) else layer[i]
-            nxt.append(hashlib.sha256(left + right).digest())
-        layer = nxt
-    return layer[0].hex()
-
-def list_event_files() -> List[Path]:
-    files = []
-    for p in DECISIONS.glob("*.json"):
-        if p.name in IGNORE:
-            continue
-        # accept only timestamp-named files as "events"
-        if TS_RE.match(p.stem):
-            files.append(p)
-    return sorted(files, key=lambda x: x.stem)
+    # each layer is one contiguous buffer of 32-byte nodes
+    layer = b"".join(hashes)
+    n = len(hashes)
+    while n > 1:
+        layer = hash_pairs(layer, n)
+        n = (n + 1) // 2
+    return layer.hex()
 
 def derive_degradation_state(event: Dict[str, Any]) -> str:
     """
@@ -91,6 +79,29 @@ def derive_degradation_state(event: Dict[str, Any]) -> str:
         return "DEGRADED_MISSING_EVALUATION"
     return "HEALTHY"
 
+# Events share a handful of constraints_evaluated / constraint_absence
+# values: hand out one list per distinct value. Shared, so never mutated.
+_INTERNED_LISTS: Dict[Tuple[Any, ...], List[Any]] = {}
+
+def _interned(values) -> List[Any]:
+    key = tuple(values)
+    return _INTERNED_LISTS.setdefault(key, list(key))
+
+@lru_cache(maxsize=4096)
+def _compute_absence(ce: Tuple[Any, ...], ho_unset: bool, has_guard: bool, logged: Tuple[Any, ...]) -> Tuple[Any, ...]:
+    """
+    Sorted constraint_absence for an event of this shape: the absences
+    already logged plus the ones derived from it. Events share a handful of
+    shapes, so this is computed once per shape rather than once per event.
+    """
+    abs_set = set(logged)
+    if "human_override" in ce and ho_unset:
+        abs_set.add("human_override")
+    # temporal_authority is not per-event in v1; leave to status/verify layer
+    if "safety_limits" in ce and not has_guard:
+        abs_set.add("safety_limits")
+    return tuple(sorted(abs_set))
+
 def ensure_fields(event: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
     changed = False
 
@@ -99,20 +110,20 @@ def ensure_fields(event: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
         changed = True
 
     if "constraints_evaluated" not in event:
-        event["constraints_evaluated"] = list(BASELINE_EVAL)
+        event["constraints_evaluated"] = _interned(BASELINE_EVAL)
         changed = True
     else:
         # merge baseline + existing (e.g., raid0_policy)
-        if isinstance(event.get("constraints_evaluated"), list):
-            merged = list(dict.fromkeys(list(BASELINE_EVAL) + event["constraints_evaluated"]))
-            if merged != event["constraints_evaluated"]:
-                event["constraints_evaluated"] = merged
-                changed = True
+        existing = event["constraints_evaluated"]
+        # already merged iff it leads with the baseline and has no repeats
+        if isinstance(existing, list) and (
+            tuple(existing[:len(BASELINE_EVAL)]) != BASELINE_EVAL or len(set(existing)) != len(existing)
+        ):
+            event["constraints_evaluated"] = _interned(dict.fromkeys(BASELINE_EVAL + tuple(existing)))
+            changed = True
+        elif isinstance(existing, list):
+            event["constraints_evaluated"] = _INTERNED_LISTS.setdefault(tuple(existing), existing)
 
-    if "constraints_evaluated" not in event:
-        # v1 baseline: what we explicitly claim to check
-        event["constraints_evaluated"] = ["human_override", "temporal_authority", "safety_limits"]
-        changed = True
     if "constraint_evaluation_complete" not in event:
         event["constraint_evaluation_complete"] = True
         changed = True
@@ -123,20 +134,18 @@ def ensure_fields(event: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
         changed = True
 
     # v1 absence computation (mechanical)
-    if isinstance(event.get("constraints_evaluated"), list):
-        abs_set = set(event.get("constraint_absence") or [])
-        ce = set(event["constraints_evaluated"])
+    ce = event.get("constraints_evaluated")
+    if isinstance(ce, list):
         # human_override considered present only if explicit and not unknown
-        if "human_override" in ce and event.get("human_override") in (None, "unknown"):
-            abs_set.add("human_override")
-        # temporal_authority is not per-event in v1; leave to status/verify layer
+        ho_unset = event.get("human_override") in (None, "unknown")
         # safety_limits present if constraints include any known guard keys
-        c = event.get("constraints") or {}
-        if "safety_limits" in ce and not any(k in c for k in ("safety_limits", "max_tokens", "max_duration")):
-            abs_set.add("safety_limits")
-        event["constraint_absence"] = sorted(abs_set)
+        has_guard = not _GUARD_KEYS.isdisjoint(event.get("constraints") or {})
+        absence = _interned(_compute_absence(tuple(ce), ho_unset, has_guard, tuple(event.get("constraint_absence") or ())))
+        if event.get("constraint_absence") is not absence:
+            event["constraint_absence"] = absence
         # if we have any absences, evaluation is incomplete only if we failed to check anything
-        event["constraint_evaluation_complete"] = True
+        if event.get("constraint_evaluation_complete") is not True:
+            event["constraint_evaluation_complete"] = True
 
     # Ensure degradation_state exists and is coherent with event as written
     ds = derive_degradation_state(event)
@@ -146,114 +155,274 @@ def ensure_fields(event: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
 
     return event, changed
 
-def compute_chain(events: List[Tuple[Path, Dict[str, Any]]]) -> List[Tuple[Path, Dict[str, Any]]]:
+def load_hash_cache() -> Dict[str, List[Any]]:
     """
-    Adds:
-      - prev_hash: hash of previous event record (event_hash)
-      - event_hash: SHA256(prev_hash || canonical_event_json_without_hash_fields)
+    filename -> [mtime_ns, size, prev_hash, event_hash] as of the last run.
+    Dropped wholesale when the schema moves, since migration may then change
+    any event.
     """
+    cache = read_json(HASH_CACHE)
+    if not isinstance(cache, dict) or cache.get("schema_version") != SCHEMA_VERSION:
+        return {}
+    return load_chain_cache(cache.get("events"))
+
+def checkpointed_prefix(files: List[Path], cache: Dict[str, List[Any]]) -> int:
+    """
+    Number of leading event files already covered by checkpoints/latest.json,
+    or 0 when that cannot be trusted. The chain is append-only, so once the
+    checkpointed head is still the event_hash of files[n-1] and the hash
+    cache chains cleanly up to it, files[:n] need not be looked at again.
+    """
+    latest = read_json(CHECKPOINTS / "latest.json") or {}
+    n = latest.get("event_count")
+    head = latest.get("head_event_hash")
+    if not isinstance(n, int) or not 0 < n <= len(files):
+        return 0
     prev = "0" * 64
+    for p in files[:n]:
+        entry = cache.get(p.name)
+        if entry is None or entry[2] != prev:
+            return 0
+        prev = entry[3]
+    if prev != head or (read_json(files[n - 1]) or {}).get("event_hash") != head:
+        return 0
+    return n
+
+@dataclass
+class MMRAccumulator:
+    """
+    Append-only Merkle frontier (Merkle Mountain Range peaks): one perfect
+    subtree root per set bit of count, highest first.
+      - append: O(log n), amortized O(1)
+      - root: O(log n), identical to merkle_root_hex over the same leaves
+    """
+    count: int = 0
+    peaks: List[bytes] = field(default_factory=list)
+
+    def append(self, leaf: bytes) -> None:
+        node = leaf
+        c = self.count
+        while c & 1:
+            node = hashlib.sha256(self.peaks.pop() + node).digest()
+            c >>= 1
+        self.peaks.append(node)
+        self.count += 1
+
+    def root(self) -> Optional[bytes]:
+        if not self.count:
+            return None
+        top = self.count.bit_length() - 1
+        by_level = dict(zip((l for l in range(top, -1, -1) if self.count >> l & 1), self.peaks))
+        # Fold the lower peaks into the partial right edge of the tree; a lone
+        # node on an odd layer is paired with itself, as in merkle_root_hex.
+        carry = None
+        for l in range(top):
+            peak = by_level.get(l)
+            if peak is not None:
+                carry = hashlib.sha256(peak + (carry if carry is not None else peak)).digest()
+            elif carry is not None:
+                carry = hashlib.sha256(carry + carry).digest()
+        if carry is None:
+            return by_level[top]
+        return hashlib.sha256(by_level[top] + carry).digest()
+
+def load_mmr_state(event_hashes: List[bytes], cadence: int) -> MMRAccumulator:
+    """
+    Resume from checkpoints/_mmr_state.json when it describes a prefix of
+    event_hashes. The chain makes each event_hash commit to every earlier
+    event, so a matching head hash means the whole prefix is unchanged.
+    """
+    state = read_json(MMR_STATE)
+    try:
+        n = state["event_count"]
+        peaks = [bytes.fromhex(p) for p in state["peaks"]]
+        if (
+            state["cadence"] == cadence
+            and 0 < n <= len(event_hashes)
+            and event_hashes[n - 1].hex() == state["head_event_hash"]
+            and len(peaks) == bin(n).count("1")
+        ):
+            return MMRAccumulator(n, peaks)
+    except (TypeError, KeyError, ValueError):
+        pass
+    return MMRAccumulator()
+
+def _utc_stamp(ts_ns: int) -> str:
+    t = time.gmtime(ts_ns // 1_000_000_000)
+    return f"{t.tm_year:04d}{t.tm_mon:02d}{t.tm_mday:02d}T{t.tm_hour:02d}{t.tm_min:02d}{t.tm_sec:02d}Z"
+
+def append_checkpoint_record(f, event_count: int, head: bytes, root: bytes, ts_ns: int) -> None:
+    f.write(CHECKPOINT_REC.pack(event_count, head, root, ts_ns))
+
+def read_checkpoints_bin(p: Path = CHECKPOINTS_BIN) -> List[Dict[str, Any]]:
+    """
+    Decode checkpoints.bin for verifier tooling; a torn trailing record
+    (interrupted append) is ignored.
+    """
+    try:
+        buf = p.read_bytes()
+    except FileNotFoundError:
+        return []
     out = []
-    for p, ev in events:
-        # compute over a copy without hashes
-        payload = dict(ev)
-        payload.pop("event_hash", None)
-        payload.pop("prev_hash", None)
-
-        # include prev hash in the hashed payload deterministically
-        # by hashing prev||canonical(payload)
-        h = sha256_hex(bytes.fromhex(prev) + canonical_bytes(payload))
-
-        # set fields
-        if ev.get("prev_hash") != prev:
-            ev["prev_hash"] = prev
-        if ev.get("event_hash") != h:
-            ev["event_hash"] = h
-
-        prev = h
-        out.append((p, ev))
+    for n, head, root, ts_ns in CHECKPOINT_REC.iter_unpack(buf[:len(buf) - len(buf) % CHECKPOINT_REC.size]):
+        out.append({
+            "event_count": n,
+            "head_event_hash": head.hex(),
+            "merkle_root": root.hex(),
+            "generated_at_ns": ts_ns,
+        })
     return out
 
-def write_checkpoints(event_hashes: List[str], cadence: int = 10) -> List[Path]:
+def write_checkpoints(event_hashes: List[bytes], cadence: int = 10, resume: bool = True) -> int:
     CHECKPOINTS.mkdir(parents=True, exist_ok=True)
-    written = []
-
-    for i in range(cadence, len(event_hashes) + 1, cadence):
-        window = event_hashes[:i]
-        root = merkle_root_hex(window)
-        if root is None:
-            continue
-
-        # Use the i-th event as checkpoint id anchor if possible
-        chk_id = f"events_{i:06d}"
-        p = CHECKPOINTS / f"{chk_id}.json"
-
-        chk = {
-            "schema_version": SCHEMA_VERSION,
-            "type": "merkle_checkpoint",
-            "algorithm": HASH_ALGO,
-            "event_count": i,
-            "head_event_hash": window[-1],
-            "merkle_root": root,
-            "generated_at": datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ"),
-            "cadence": cadence,
-        }
-        write_json(p, chk)
-        written.append(p)
+    written = 0
+    # one timestamp for everything generated in this run
+    now_ns = time.time_ns()
+
+    # cadence checkpoints up to acc.count were appended by an earlier run;
+    # anything past them (history rewritten, interrupted run) is dropped
+    acc = load_mmr_state(event_hashes, cadence) if resume else MMRAccumulator()
+    with open(CHECKPOINTS_BIN, "ab") as f:
+        keep = acc.count // cadence * CHECKPOINT_REC.size
+        if os.fstat(f.fileno()).st_size < keep:
+            # records the state accounts for are missing (file deleted, or the
+            # state predates checkpoints.bin): rebuild them all
+            acc = MMRAccumulator()
+            keep = 0
+        f.truncate(keep)
+        for h in event_hashes[acc.count:]:
+            acc.append(h)
+            if acc.count % cadence:
+                continue
+            append_checkpoint_record(f, acc.count, h, acc.root(), now_ns)
+            written += 1
+
+    # per-cadence events_NNNNNN.json files from before checkpoints.bin are superseded by it
+    for p in CHECKPOINTS.glob("events_[0-9]*.json"):
+        p.unlink()
 
     # Always write "latest" checkpoint pointer
     latest_p = CHECKPOINTS / "latest.json"
     if event_hashes:
-        # compute full root too
-        full_root = merkle_root_hex(event_hashes)
         latest = {
             "schema_version": SCHEMA_VERSION,
             "type": "merkle_checkpoint_latest",
             "algorithm": HASH_ALGO,
             "event_count": len(event_hashes),
-            "head_event_hash": event_hashes[-1],
-            "merkle_root": full_root,
-            "generated_at": datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ"),
+            "head_event_hash": event_hashes[-1].hex(),
+            "merkle_root": acc.root().hex(),
+            "generated_at": _utc_stamp(now_ns),
         }
         write_json(latest_p, latest)
-        written.append(latest_p)
+        written += 1
+
+        write_json(MMR_STATE, {
+            "cadence": cadence,
+            "event_count": acc.count,
+            "head_event_hash": event_hashes[-1].hex(),
+            "peaks": [p.hex() for p in acc.peaks],
+        })
 
     return written
 
-def main() -> int:
-    files = list_event_files()
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Migrate decision events and rebuild the hash chain and checkpoints.")
+    mode = ap.add_mutually_exclusive_group()
+    mode.add_argument("--incremental", action="store_true",
+                      help="only process events after the head recorded in checkpoints/latest.json")
+    mode.add_argument("--full", action="store_true",
+                      help="ignore the hash cache and re-read and re-hash every event (audit)")
+    args = ap.parse_args(argv)
+
+    files = list_event_files(DECISIONS)
     if not files:
         print("no timestamp event files found in decisions/")
         return 1
 
-    # Load + migrate fields
-    loaded: List[Tuple[Path, Dict[str, Any]]] = []
+    # One pass: load -> migrate -> chain -> write back if changed.
+    # A file untouched since the last run that still chains onto the same
+    # predecessor keeps its cached event_hash and is not read at all.
+    cache = {} if args.full else load_hash_cache()
+
+    start = 0
+    if args.incremental:
+        start = checkpointed_prefix(files, cache)
+        if not start:
+            print("incremental: checkpointed head not found, falling back to full scan")
+    stats = [p.stat() for p in files[start:]]
+
+    def unchanged(p: Path, st: os.stat_result) -> bool:
+        entry = cache.get(p.name)
+        return entry is not None and entry[:2] == [st.st_mtime_ns, st.st_size]
+
+    events_cache: Dict[str, List[Any]] = {}
+    dirty: List[Tuple[Path, Dict[str, Any]]] = []
+    # chain state is kept as raw digests; hex only where it is written out
+    hashes: List[bytes] = []
     migrated = 0
-    for p in files:
-        ev = read_json(p)
-        if not isinstance(ev, dict):
-            print(f"skip unreadable: {p}")
-            continue
-        ev, changed = ensure_fields(ev)
-        if changed:
-            migrated += 1
-        loaded.append((p, ev))
-
-    # Chain
-    chained = compute_chain(loaded)
-
-    # Write back decisions
-    for p, ev in chained:
-        write_json(p, ev)
-
-    # Collect hashes and checkpoint
-    hashes = [ev["event_hash"] for _, ev in chained if isinstance(ev.get("event_hash"), str)]
-    written = write_checkpoints(hashes, cadence=10)
-
-    print(f"events: {len(chained)}")
+    prev = "0" * 64
+    # the checkpointed prefix is carried over from the cache as-is
+    for p in files[:start]:
+        events_cache[p.name] = cache[p.name]
+        prev = cache[p.name][3]
+        hashes.append(bytes.fromhex(prev))
+    prev_raw = bytes.fromhex(prev)
+    with ThreadPoolExecutor() as ex:
+        # Chaining is sequential, but the file reads it needs are not:
+        # fetch every file that changed on disk up front, overlapping the I/O.
+        to_read = [p for p, st in zip(files[start:], stats) if not unchanged(p, st)]
+        preloaded = dict(zip(to_read, ex.map(read_event, to_read)))
+
+        for p, st in zip(files[start:], stats):
+            if unchanged(p, st) and cache[p.name][2] == prev:
+                h = cache[p.name][3]
+                h_raw = bytes.fromhex(h)
+            else:
+                ev, has_float = preloaded.pop(p) if p in preloaded else read_event(p)
+                if not isinstance(ev, dict):
+                    print(f"skip unreadable: {p}")
+                    continue
+                ev, changed = ensure_fields(ev)
+                if changed:
+                    migrated += 1
+
+                # event_hash = SHA256(prev_hash || canonical_event_json_without_hash_fields)
+                # the hash fields are popped for the encode and set again
+                # below, rather than copying every event into a payload dict
+                old_prev = ev.pop("prev_hash", None)
+                old_h = ev.pop("event_hash", None)
+                hasher = hashlib.sha256(prev_raw)
+                # migration adds no floats, so the parser's verdict still holds
+                hasher.update(canonical_bytes(ev, float_free=not has_float))
+                h_raw = hasher.digest()
+                h = h_raw.hex()
+                ev["prev_hash"] = prev
+                ev["event_hash"] = h
+                if old_prev != prev or old_h != h:
+                    changed = True
+
+                if changed:
+                    dirty.append((p, ev))
+            events_cache[p.name] = [st.st_mtime_ns, st.st_size, prev, h]
+            hashes.append(h_raw)
+            prev, prev_raw = h, h_raw
+
+        # Write back decisions that changed
+        list(ex.map(lambda pe: write_json(*pe), dirty))
+
+    for p, _ in dirty:
+        st = p.stat()
+        events_cache[p.name][:2] = [st.st_mtime_ns, st.st_size]
+    CHECKPOINTS.mkdir(parents=True, exist_ok=True)
+    write_json(HASH_CACHE, {"schema_version": SCHEMA_VERSION, "events": events_cache})
+
+    # Checkpoint
+    written = write_checkpoints(hashes, cadence=10, resume=not args.full)
+
+    print(f"events: {len(hashes)}")
     print(f"migrated_fields: {migrated}")
-    print(f"head_event_hash: {hashes[-1] if hashes else None}")
-    print(f"checkpoints_written: {len(written)}")
+    print(f"head_event_hash: {hashes[-1].hex() if hashes else None}")
+    print(f"checkpoints_written: {written}")
     return 0
 
 if __name__ == "__main__":